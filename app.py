@@ -2,17 +2,168 @@ import streamlit as st
 import pandas as pd
 from io import BytesIO
 import plotly.express as px
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import numpy as np
+from importlib.util import find_spec
 
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import (
     SimpleDocTemplate, Paragraph, Spacer,
-    Table, TableStyle, Image, PageBreak
+    Table, LongTable, TableStyle, Image, PageBreak
 )
 
+# =====================================================
+# DATA LOADING
+# =====================================================
+# Faster readers when their optional packages are installed
+CSV_ENGINE = "pyarrow" if find_spec("pyarrow") else "c"
+EXCEL_ENGINE = "calamine" if find_spec("python_calamine") else None
+
+
+def read_upload(file_bytes: bytes, name: str) -> pd.DataFrame:
+    if not name.endswith(".csv"):
+        return pd.read_excel(BytesIO(file_bytes), engine=EXCEL_ENGINE)
+
+    if CSV_ENGINE == "pyarrow":
+        try:
+            df = pd.read_csv(BytesIO(file_bytes), engine="pyarrow")
+        except ValueError:
+            # pyarrow rejects ragged rows the C engine pads with NaN
+            df = None
+        # pyarrow turns offset timestamps into UTC; re-read those to keep local times
+        if df is not None and not any(isinstance(t, pd.DatetimeTZDtype) for t in df.dtypes):
+            return df
+
+    return pd.read_csv(BytesIO(file_bytes), engine="c")
+
+
+def parse_times(col: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col
+
+    try:
+        parsed = pd.to_datetime(col, format="ISO8601", errors="coerce", cache=True)
+    except ValueError:
+        # Offset and naive strings mixed in one column
+        return pd.to_datetime(col, errors="coerce", cache=True)
+
+    missed = parsed.isna() & col.notna()
+    if missed.any():
+        fallback = pd.to_datetime(col[missed], errors="coerce", cache=True).dropna()
+        if fallback.empty:
+            return parsed
+        if getattr(fallback.dtype, "tz", None) != getattr(parsed.dtype, "tz", None):
+            return pd.to_datetime(col, errors="coerce", cache=True)
+        parsed[fallback.index] = fallback
+    return parsed
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_and_prepare(file_bytes: bytes, name: str) -> pd.DataFrame:
+    df = read_upload(file_bytes, name)
+    df.columns = df.columns.str.strip()
+
+    df["Start Time"] = parse_times(df["Start Time"])
+    df["End Time"] = parse_times(df["End Time"])
+    # Report days follow the local wall-clock time of the session start
+    start = df["Start Time"]
+    if start.dt.tz is not None:
+        start = start.dt.tz_localize(None)
+    df["Date"] = start.dt.normalize()
+    return df
+
+
+# =====================================================
+# DASHBOARD CHARTS
+# =====================================================
+@st.cache_data(show_spinner=False)
+def build_driver_fig(top_chargers: pd.DataFrame):
+    fig = px.bar(
+        top_chargers,
+        x="Usage (kWh)",
+        y="Charger ID",
+        orientation="h",
+        text=top_chargers["Usage (kWh)"].round(2),
+        title="Charger ID-wise Energy Usage (kWh)",
+        color_discrete_sequence=["#2563eb"]
+    )
+    fig.update_traces(textposition="outside")
+    fig.update_layout(margin=dict(l=160, r=60))
+    return fig
+
+
+@st.cache_data(show_spinner=False)
+def build_hub_fig(top_hubs: pd.DataFrame):
+    return px.pie(
+        top_hubs,
+        names="Hub Name",
+        values="Usage (kWh)",
+        title="Hub-wise Energy Distribution"
+    )
+
+
+# =====================================================
+# PDF STYLES
+# =====================================================
+title_style = ParagraphStyle(
+    name="HeaderTitle",
+    fontSize=16,
+    textColor=colors.white,
+    alignment=1,
+    leading=18
+)
+cell_style = ParagraphStyle(name="Cell", fontSize=7.2, leading=9)
+header_style = ParagraphStyle(name="HeaderCell", fontSize=8, textColor=colors.white)
+
+# Free-text and ID columns are wrapped in Paragraphs; numbers, durations and times are plain strings
+WRAP_COLS = {"Hub Name", "Session ID", "Charger ID", "VIN NUMBER", "Status"}
+
+
+# =====================================================
+# PDF CHARTS
+# =====================================================
+def make_driver_chart(top_chargers: pd.DataFrame) -> BytesIO:
+    fig = Figure(figsize=(9,4.5))
+    ax = fig.subplots()
+    bars = ax.barh(top_chargers["Charger ID"], top_chargers["Usage (kWh)"], color="#2563eb")
+    max_val = top_chargers["Usage (kWh)"].max()
+    ax.set_xlim(0, max_val*1.25)
+
+    for bar in bars:
+        w = bar.get_width()
+        ax.text(w + max_val*0.02, bar.get_y()+bar.get_height()/2, f"{w:.2f}", va="center", fontsize=10)
+
+    ax.set_xlabel("Energy (kWh)")
+    ax.set_title("Charger ID-wise Energy Usage (kWh)")
+    fig.tight_layout()
+    buf = BytesIO()
+    fig.savefig(buf, format="png", dpi=120, bbox_inches="tight")
+    buf.seek(0)
+    return buf
+
+
+def make_hub_chart(top_hubs: pd.DataFrame) -> BytesIO:
+    fig = Figure(figsize=(6.5,5))
+    ax = fig.subplots()
+    ax.pie(
+        top_hubs["Usage (kWh)"],
+        labels=top_hubs["Hub Name"],
+        autopct="%1.1f%%",
+        startangle=90,
+        pctdistance=0.75,
+        labeldistance=1.08,
+        textprops={"fontsize":10}
+    )
+    ax.set_title("Hub-wise Energy Distribution", fontsize=13)
+    fig.tight_layout()
+    buf = BytesIO()
+    fig.savefig(buf, format="png", dpi=120, bbox_inches="tight")
+    buf.seek(0)
+    return buf
+
+
 # =====================================================
 # STREAMLIT UI
 # =====================================================
@@ -26,79 +177,87 @@ uploaded_file = st.file_uploader(
 
 if uploaded_file:
     # ================= LOAD DATA =================
-    df = pd.read_csv(uploaded_file) if uploaded_file.name.endswith(".csv") else pd.read_excel(uploaded_file)
-    df.columns = df.columns.str.strip()
+    df = load_and_prepare(uploaded_file.getvalue(), uploaded_file.name)
 
-    df["Start Time"] = pd.to_datetime(df["Start Time"], errors="coerce")
-    df["End Time"] = pd.to_datetime(df["End Time"], errors="coerce")
-    df["Date"] = df["Start Time"].dt.date
+    dates = np.sort(df["Date"].dropna().unique())
+    date_labels = pd.DatetimeIndex(dates).strftime("%Y-%m-%d").tolist()
+    if not date_labels:
+        st.error("No data available for selected date.")
+        st.stop()
 
-    dates = sorted(df["Date"].dropna().unique())
-    report_date = st.selectbox("Select Report Date", dates)
+    # The submitted date belongs to the upload it was picked for
+    file_id, report_date = st.session_state.get("report_date", (None, None))
+    if file_id != uploaded_file.file_id or report_date not in date_labels:
+        report_date = None
+
+    # Changing the date only reruns the report once the form is submitted
+    with st.form("report_form"):
+        selected_date = st.selectbox(
+            "Select Report Date",
+            date_labels,
+            index=date_labels.index(report_date) if report_date else 0
+        )
+        submitted = st.form_submit_button("Show Report")
 
-    daily_df = df[df["Date"] == report_date].copy()
+    if submitted:
+        report_date = selected_date
+        st.session_state["report_date"] = (uploaded_file.file_id, report_date)
+
+    # Nothing to show until a date from this upload has been submitted
+    if report_date is None:
+        st.stop()
+
+    mask = df["Date"].values == np.datetime64(pd.Timestamp(report_date))
+    report_cols = [
+        "Hub Name","Session ID","Device ID","VIN NUMBER",
+        "Usage (kWh)","Duration","Status",
+        "SOC In (%)","SOC Out (%)","Start Time","End Time"
+    ]
+    daily_df = df.loc[mask, [c for c in report_cols if c in df.columns]].copy()
     if daily_df.empty:
         st.error("No data available for selected date.")
         st.stop()
 
+    # Categorical group keys let the groupbys below work on integer codes
     # 🔁 RENAMED
-    daily_df["Charger ID"] = daily_df["Device ID"].astype(str)
+    daily_df["Charger ID"] = daily_df["Device ID"].astype(str).astype("category")
+    daily_df["Hub Name"] = daily_df["Hub Name"].astype("category")
+
+    daily_df["Usage (kWh)"] = pd.to_numeric(daily_df["Usage (kWh)"], errors="coerce").astype("float64")
 
     # ================= KPIs =================
     total_sessions = len(daily_df)
-    total_energy = round(pd.to_numeric(daily_df["Usage (kWh)"], errors="coerce").sum(), 2)
+    total_energy = round(daily_df["Usage (kWh)"].sum(), 2)
 
     # ================= DRIVER/CHARGER DATA =================
-    charger_usage = (
-        daily_df.groupby("Charger ID", as_index=False)["Usage (kWh)"]
-        .sum()
-        .sort_values("Usage (kWh)", ascending=False)
-    )
-
-    top_chargers = charger_usage.head(8)
-    other_val = charger_usage.iloc[8:]["Usage (kWh)"].sum()
+    charger_usage = daily_df.groupby("Charger ID", sort=False, observed=True)["Usage (kWh)"].sum()
+    top = charger_usage.nlargest(8)
+    other_val = charger_usage.drop(top.index).sum()
 
     if other_val > 0:
-        top_chargers = pd.concat([
-            top_chargers,
-            pd.DataFrame([{"Charger ID": "Others", "Usage (kWh)": other_val}])
-        ])
+        top_chargers = pd.DataFrame({
+            "Charger ID": [*top.index.astype(str), "Others"],
+            "Usage (kWh)": [*top.values, other_val]
+        })
+    else:
+        top_chargers = pd.DataFrame({"Charger ID": top.index.astype(str), "Usage (kWh)": top.values})
 
     # ================= HUB DATA =================
-    hub_usage = (
-        daily_df.groupby("Hub Name", as_index=False)["Usage (kWh)"]
-        .sum()
-        .sort_values("Usage (kWh)", ascending=False)
-    )
-
-    top_hubs = hub_usage.head(6)
-    other_hubs = hub_usage.iloc[6:]["Usage (kWh)"].sum()
+    hub_usage = daily_df.groupby("Hub Name", sort=False, observed=True)["Usage (kWh)"].sum()
+    top = hub_usage.nlargest(6)
+    other_hubs = hub_usage.drop(top.index).sum()
 
     if other_hubs > 0:
-        top_hubs = pd.concat([
-            top_hubs,
-            pd.DataFrame([{"Hub Name": "Others", "Usage (kWh)": other_hubs}])
-        ])
+        top_hubs = pd.DataFrame({
+            "Hub Name": [*top.index.astype(str), "Others"],
+            "Usage (kWh)": [*top.values, other_hubs]
+        })
+    else:
+        top_hubs = pd.DataFrame({"Hub Name": top.index.astype(str), "Usage (kWh)": top.values})
 
     # ================= DASHBOARD (BROWSER) =================
-    fig_driver = px.bar(
-        top_chargers,
-        x="Usage (kWh)",
-        y="Charger ID",
-        orientation="h",
-        text=top_chargers["Usage (kWh)"].round(2),
-        title="Charger ID-wise Energy Usage (kWh)",
-        color_discrete_sequence=["#2563eb"]
-    )
-    fig_driver.update_traces(textposition="outside")
-    fig_driver.update_layout(margin=dict(l=160, r=60))
-
-    fig_hub = px.pie(
-        top_hubs,
-        names="Hub Name",
-        values="Usage (kWh)",
-        title="Hub-wise Energy Distribution"
-    )
+    fig_driver = build_driver_fig(top_chargers)
+    fig_hub = build_hub_fig(top_hubs)
 
     st.plotly_chart(fig_driver, use_container_width=True)
     st.plotly_chart(fig_hub, use_container_width=True)
@@ -118,14 +277,6 @@ if uploaded_file:
 
         styles = getSampleStyleSheet()
 
-        title_style = ParagraphStyle(
-            name="HeaderTitle",
-            fontSize=16,
-            textColor=colors.white,
-            alignment=1,
-            leading=18
-        )
-
         elements = []
 
         # ---------- HEADER ----------
@@ -158,48 +309,16 @@ if uploaded_file:
         elements.append(kpi)
         elements.append(Spacer(1, 18))
 
-        # ---------- DRIVER BAR (PDF) ----------
-        plt.figure(figsize=(9,4.5))
-        bars = plt.barh(top_chargers["Charger ID"], top_chargers["Usage (kWh)"], color="#2563eb")
-        max_val = top_chargers["Usage (kWh)"].max()
-        plt.xlim(0, max_val*1.25)
-
-        for bar in bars:
-            w = bar.get_width()
-            plt.text(w + max_val*0.02, bar.get_y()+bar.get_height()/2, f"{w:.2f}", va="center", fontsize=10)
-
-        plt.xlabel("Energy (kWh)")
-        plt.title("Charger ID-wise Energy Usage (kWh)")
-        plt.tight_layout()
-        plt.savefig("driver_pdf.png")
-        plt.close()
-
-        # ---------- HUB PIE (PDF) ----------
-        plt.figure(figsize=(6.5,5))
-        plt.pie(
-            top_hubs["Usage (kWh)"],
-            labels=top_hubs["Hub Name"],
-            autopct="%1.1f%%",
-            startangle=90,
-            pctdistance=0.75,
-            labeldistance=1.08,
-            textprops={"fontsize":10}
-        )
-        plt.title("Hub-wise Energy Distribution", fontsize=13)
-        plt.tight_layout()
-        plt.savefig("hub_pdf.png")
-        plt.close()
+        driver_buf = make_driver_chart(top_chargers)
+        hub_buf = make_hub_chart(top_hubs)
 
-        elements.append(Image("driver_pdf.png", width=480, height=250))
+        elements.append(Image(driver_buf, width=480, height=250))
         elements.append(Spacer(1,18))
-        elements.append(Image("hub_pdf.png", width=420, height=280))
+        elements.append(Image(hub_buf, width=420, height=280))
 
         elements.append(PageBreak())
 
         # ---------- SESSION TABLE ----------
-        cell_style = ParagraphStyle(name="Cell", fontSize=7.2, leading=9)
-        header_style = ParagraphStyle(name="HeaderCell", fontSize=8, textColor=colors.white)
-
         headers = [
             "Hub","Session ID","Charger ID","VIN",
             "kWh","Duration","Status",
@@ -208,22 +327,21 @@ if uploaded_file:
 
         table_data = [[Paragraph(h, header_style) for h in headers]]
 
-        for _, r in daily_df.iterrows():
-            table_data.append([
-                Paragraph(str(r.get("Hub Name","")), cell_style),
-                Paragraph(str(r.get("Session ID","")), cell_style),
-                Paragraph(str(r.get("Charger ID","")), cell_style),
-                Paragraph(str(r.get("VIN NUMBER","")), cell_style),
-                Paragraph(str(r.get("Usage (kWh)","")), cell_style),
-                Paragraph(str(r.get("Duration","")), cell_style),
-                Paragraph(str(r.get("Status","")), cell_style),
-                Paragraph(str(r.get("SOC In (%)","")), cell_style),
-                Paragraph(str(r.get("SOC Out (%)","")), cell_style),
-                Paragraph(r["Start Time"].strftime("%d-%m %H:%M"), cell_style),
-                Paragraph(r["End Time"].strftime("%d-%m %H:%M"), cell_style),
-            ])
-
-        table = Table(
+        table_cols = [
+            "Hub Name","Session ID","Charger ID","VIN NUMBER",
+            "Usage (kWh)","Duration","Status",
+            "SOC In (%)","SOC Out (%)"
+        ]
+        disp = daily_df.reindex(columns=table_cols).astype(object)
+        disp = disp.where(disp.notna(), "").astype(str)
+        disp["Start"] = daily_df["Start Time"].dt.strftime("%d-%m %H:%M").fillna("")
+        disp["End"] = daily_df["End Time"].dt.strftime("%d-%m %H:%M").fillna("")
+        wrap = [c in WRAP_COLS for c in disp.columns]
+
+        for row in disp.itertuples(index=False, name=None):
+            table_data.append([Paragraph(v, cell_style) if w else v for v, w in zip(row, wrap)])
+
+        table = LongTable(
             table_data,
             repeatRows=1,
             colWidths=[50,50,60,85,35,45,55,45,45,60,60]
@@ -231,6 +349,9 @@ if uploaded_file:
         table.setStyle(TableStyle([
             ("BACKGROUND",(0,0),(-1,0),colors.HexColor("#1f4e79")),
             ("GRID",(0,0),(-1,-1),0.3,colors.grey),
+            ("FONTSIZE",(0,1),(-1,-1),7.2),
+            ("LEADING",(0,1),(-1,-1),9),
+            ("VALIGN",(0,0),(-1,-1),"TOP"),
         ]))
 
         elements.append(table)